@@ -0,0 +1,270 @@
+"""
+Агрегированная статистика по расчетам пользователей.
+
+Запросы не сохраняются: каждая метрика хранит только счетчики,
+гистограмму с фиксированными корзинами и P²-оценки квантилей,
+поэтому объем памяти не зависит от числа расчетов.
+Состояние периодически сохраняется на диск и восстанавливается при старте.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+class P2Quantile:
+    """
+    Потоковая оценка квантиля алгоритмом P² (Jain & Chlamtac, 1985).
+    Хранит пять маркеров вместо всех наблюдений.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        if len(q) < 5:
+            bisect.insort(q, x)
+            return
+
+        # Находим ячейку k: q[k] <= x < q[k + 1]
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+
+        for i in range(k + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Корректируем средние маркеры, если они отстали от желаемых позиций
+        n = self.positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[int(round(self.p * (len(q) - 1)))]
+        return q[2]
+
+    def to_dict(self):
+        return {'p': self.p, 'heights': self.heights, 'positions': self.positions, 'desired': self.desired}
+
+    @classmethod
+    def from_dict(cls, state):
+        estimator = cls(state['p'])
+        estimator.heights = list(state['heights'])
+        estimator.positions = list(state['positions'])
+        estimator.desired = list(state['desired'])
+        return estimator
+
+class Metric:
+    """Потоковая метрика: счетчики, гистограмма [lo, hi) с шагом width и квантили"""
+
+    def __init__(self, lo, hi, width):
+        self.lo = lo
+        self.hi = hi
+        self.width = width
+        self.bins = [0] * int(math.ceil((hi - lo) / width))
+        self.underflow = 0
+        self.overflow = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = [P2Quantile(p) for p in QUANTILES]
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        if x < self.lo:
+            self.underflow += 1
+        elif x >= self.hi:
+            self.overflow += 1
+        else:
+            self.bins[int((x - self.lo) // self.width)] += 1
+        for estimator in self.quantiles:
+            estimator.add(x)
+
+    def summary(self):
+        """Сводка для админки: только непустые корзины гистограммы"""
+        return {
+            'count': self.count,
+            'min': round(self.min, 2) if self.min is not None else None,
+            'max': round(self.max, 2) if self.max is not None else None,
+            'mean': round(self.total / self.count, 2) if self.count else None,
+            'quantiles': {
+                f'p{int(e.p * 100)}': round(e.value(), 2) if e.value() is not None else None
+                for e in self.quantiles
+            },
+            'histogram': {
+                'width': self.width,
+                'bins': {str(self.lo + i * self.width): c for i, c in enumerate(self.bins) if c},
+                'underflow': self.underflow,
+                'overflow': self.overflow
+            }
+        }
+
+    def to_dict(self):
+        return {
+            'lo': self.lo, 'hi': self.hi, 'width': self.width,
+            'bins': self.bins, 'underflow': self.underflow, 'overflow': self.overflow,
+            'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+            'quantiles': [e.to_dict() for e in self.quantiles]
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        metric = cls(state['lo'], state['hi'], state['width'])
+        metric.bins = list(state['bins'])
+        metric.underflow = state['underflow']
+        metric.overflow = state['overflow']
+        metric.count = state['count']
+        metric.total = state['total']
+        metric.min = state['min']
+        metric.max = state['max']
+        metric.quantiles = [P2Quantile.from_dict(e) for e in state['quantiles']]
+        return metric
+
+def _new_metrics():
+    return {
+        # Возраст финансовой независимости в режиме "Авто-поиск"
+        'auto_retirement_age': Metric(0, 120, 1),
+        # Возраст, в котором капитал исчерпан
+        'depletion_age': Metric(0, 120, 1),
+        # Норма сбережений при старте, % от месячного дохода
+        # (верхняя граница 105, чтобы 100% без расходов попадали в корзину)
+        'savings_rate': Metric(-100, 105, 5)
+    }
+
+class Aggregator:
+    """
+    Сбор статистики по расчетам с периодическим сохранением на диск.
+
+    Снимок записывается из record() не чаще, чем раз в snapshot_interval секунд.
+    """
+
+    def __init__(self, path=None, snapshot_interval=300):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.metrics = _new_metrics()
+        self.calculations = 0
+        self.not_depleted = 0
+        self.auto_not_reached = 0
+        self.saved_at = None
+        self.last_save = time.monotonic()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def record(self, data, results, actual_ret_age, auto_retirement_found=None):
+        """
+        Учет одного расчета /api/calculate.
+
+        data - входные параметры запроса, results - данные по годам,
+        auto_retirement_found - выполнилось ли правило 4% в режиме авто-поиска.
+        """
+        depletion_age = next((row['age'] for row in results if row['total_capital_end'] == 'Ø'), None)
+        income = float(data['monthly_income'])
+        expenses = float(data['monthly_living_expenses'])
+
+        with self.lock:
+            self.calculations += 1
+            if data.get('retirement_mode') == 'auto':
+                # Если правило 4% не выполнилось, возраст пенсии условный (max_age)
+                if auto_retirement_found:
+                    self.metrics['auto_retirement_age'].add(actual_ret_age)
+                else:
+                    self.auto_not_reached += 1
+            if depletion_age is None:
+                self.not_depleted += 1
+            else:
+                self.metrics['depletion_age'].add(depletion_age)
+            if income > 0:
+                self.metrics['savings_rate'].add((income - expenses) / income * 100)
+
+            due = self.path and time.monotonic() - self.last_save >= self.snapshot_interval
+            if due:
+                self.last_save = time.monotonic()
+        if due:
+            self.save()
+
+    def summary(self):
+        with self.lock:
+            return {
+                'calculations': self.calculations,
+                'not_depleted': self.not_depleted,
+                'auto_not_reached': self.auto_not_reached,
+                'saved_at': self.saved_at,
+                'metrics': {name: metric.summary() for name, metric in self.metrics.items()}
+            }
+
+    def save(self, path=None):
+        """Атомарная запись снимка состояния (через временный файл)"""
+        path = path or self.path
+        with self.lock:
+            self.saved_at = time.strftime('%Y-%m-%d %H:%M:%S')
+            self.last_save = time.monotonic()
+            state = {
+                'saved_at': self.saved_at,
+                'calculations': self.calculations,
+                'not_depleted': self.not_depleted,
+                'auto_not_reached': self.auto_not_reached,
+                'metrics': {name: metric.to_dict() for name, metric in self.metrics.items()}
+            }
+        tmp_path = f'{path}.tmp'
+        with self.save_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Восстановление состояния из снимка; поврежденный файл игнорируется"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            metrics = {name: Metric.from_dict(s) for name, s in state['metrics'].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Analytics snapshot {path} not loaded: {e}")
+            return False
+
+        with self.lock:
+            self.metrics.update(metrics)
+            self.calculations = state.get('calculations', 0)
+            self.not_depleted = state.get('not_depleted', 0)
+            self.auto_not_reached = state.get('auto_not_reached', 0)
+            self.saved_at = state.get('saved_at')
+        return True
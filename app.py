@@ -1,13 +1,26 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from calculator import InvestmentCalculator
+from live import LiveChannel
+from analytics import Aggregator
+import atexit
+import hmac
 import os
+import re
+import signal
 import subprocess
+import sys
 import time
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 CORS(app)
 
+# Агрегированная статистика по расчетам (без хранения самих запросов)
+analytics = Aggregator(
+    os.environ.get('ANALYTICS_PATH', 'analytics_snapshot.json'),
+    snapshot_interval=int(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL', 300))
+)
+
 @app.route('/')
 def index():
     """Главная страница - отдает index.html"""
@@ -34,59 +47,16 @@ def calculate():
     """
     try:
         data = request.json
+        try:
+            formatted_results, actual_ret_age, auto_found = run_projection_details(data)
+        except CalculationError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Валидация входных данных
-        required_fields = [
-            'initial_capital', 'monthly_income', 'monthly_living_expenses',
-            'income_growth_rate', 'interest_rate', 'inflation_rate', 
-            'current_age', 'retirement_age'
-        ]
-        
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Отсутствует поле: {field}'}), 400
-        
-        # Конвертируем проценты в десятичные дроби
-        params = {
-            'initial_capital': float(data['initial_capital']),
-            'monthly_income': float(data['monthly_income']),
-            'monthly_living_expenses': float(data['monthly_living_expenses']),
-            'income_growth_rate': float(data['income_growth_rate']) / 100,
-            'interest_rate': float(data['interest_rate']) / 100,
-            'inflation_rate': float(data['inflation_rate']) / 100,
-            'current_age': int(data['current_age']),
-            'retirement_age': int(data['retirement_age']),
-            'retirement_mode': data.get('retirement_mode', 'manual')
-        }
-        
-        # Проверка логических ограничений
-        if params['retirement_mode'] == 'manual' and params['retirement_age'] <= params['current_age']:
-            return jsonify({'error': 'Возраст пенсии должен быть больше текущего возраста'}), 400
-        
-        if params['initial_capital'] < 0:
-            return jsonify({'error': 'Начальный капитал не может быть отрицательным'}), 400
-        
-        # Создаем калькулятор и получаем результаты
-        calculator = InvestmentCalculator(params)
-        max_age = int(data.get('max_age', 90))
-        projection_data, actual_ret_age = calculator.get_full_projection(max_age)
-        
-        # Форматируем результаты для отправки
-        formatted_results = []
-        for year_data in projection_data:
-            formatted_results.append({
-                'year': year_data['year'],
-                'age': year_data['age'],
-                'investment_capital': round(year_data['investment_capital'], 2) if isinstance(year_data['investment_capital'], (int, float)) else year_data['investment_capital'],
-                'expenses_inflation': round(year_data['expenses_inflation'], 2) if isinstance(year_data['expenses_inflation'], (int, float)) else year_data['expenses_inflation'],
-                'net_capital': round(year_data['net_capital'], 2) if isinstance(year_data['net_capital'], (int, float)) else year_data['net_capital'],
-                'annual_expenses': round(year_data['annual_expenses'], 2) if isinstance(year_data['annual_expenses'], (int, float)) else year_data['annual_expenses'],
-                'total_capital_start': round(year_data['total_capital_start'], 2) if isinstance(year_data['total_capital_start'], (int, float)) else year_data['total_capital_start'],
-                'interest_income': round(year_data['interest_income'], 2) if isinstance(year_data['interest_income'], (int, float)) else year_data['interest_income'],
-                'half_year_interest': round(year_data['half_year_interest'], 2) if isinstance(year_data['half_year_interest'], (int, float)) else year_data['half_year_interest'],
-                'total_capital_end': round(year_data['total_capital_end'], 2) if isinstance(year_data['total_capital_end'], (int, float)) else year_data['total_capital_end'],
-                'expense_percentage': round(year_data['expense_percentage'], 2)
-            })
+        try:
+            analytics.record(data, formatted_results, actual_ret_age, auto_found)
+        except Exception as e:
+            # Статистика не должна ломать расчет
+            print(f"Analytics record failed: {e}")
         
         return jsonify({
             'success': True,
@@ -97,18 +67,209 @@ def calculate():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class CalculationError(Exception):
+    """Ошибка валидации входных данных расчета"""
+
+def _round_value(value):
+    return round(value, 2) if isinstance(value, (int, float)) else value
+
+def run_projection(data):
+    """
+    Валидация входных данных и расчет прогноза.
+    
+    Возвращает (список данных по годам, фактический возраст пенсии).
+    При ошибке валидации выбрасывает CalculationError.
+    """
+    formatted_results, actual_ret_age, _ = run_projection_details(data)
+    return formatted_results, actual_ret_age
+
+def run_projection_details(data):
+    """
+    То же, что run_projection, но дополнительно возвращает, выполнилось ли
+    правило 4% в режиме авто-поиска (None в ручном режиме).
+    """
+    # Валидация входных данных
+    required_fields = [
+        'initial_capital', 'monthly_income', 'monthly_living_expenses',
+        'income_growth_rate', 'interest_rate', 'inflation_rate', 
+        'current_age', 'retirement_age'
+    ]
+    
+    for field in required_fields:
+        if field not in data:
+            raise CalculationError(f'Отсутствует поле: {field}')
+    
+    # Конвертируем проценты в десятичные дроби
+    params = {
+        'initial_capital': float(data['initial_capital']),
+        'monthly_income': float(data['monthly_income']),
+        'monthly_living_expenses': float(data['monthly_living_expenses']),
+        'income_growth_rate': float(data['income_growth_rate']) / 100,
+        'interest_rate': float(data['interest_rate']) / 100,
+        'inflation_rate': float(data['inflation_rate']) / 100,
+        'current_age': int(data['current_age']),
+        'retirement_age': int(data['retirement_age']),
+        'retirement_mode': data.get('retirement_mode', 'manual')
+    }
+    
+    # Проверка логических ограничений
+    if params['retirement_mode'] == 'manual' and params['retirement_age'] <= params['current_age']:
+        raise CalculationError('Возраст пенсии должен быть больше текущего возраста')
+    
+    if params['initial_capital'] < 0:
+        raise CalculationError('Начальный капитал не может быть отрицательным')
+    
+    # Создаем калькулятор и получаем результаты
+    calculator = InvestmentCalculator(params)
+    max_age = int(data.get('max_age', 90))
+    projection_data, actual_ret_age = calculator.get_full_projection(max_age)
+    
+    # Форматируем результаты для отправки
+    formatted_results = []
+    for year_data in projection_data:
+        formatted_results.append({
+            'year': year_data['year'],
+            'age': year_data['age'],
+            'investment_capital': _round_value(year_data['investment_capital']),
+            'expenses_inflation': _round_value(year_data['expenses_inflation']),
+            'net_capital': _round_value(year_data['net_capital']),
+            'annual_expenses': _round_value(year_data['annual_expenses']),
+            'total_capital_start': _round_value(year_data['total_capital_start']),
+            'interest_income': _round_value(year_data['interest_income']),
+            'half_year_interest': _round_value(year_data['half_year_interest']),
+            'total_capital_end': _round_value(year_data['total_capital_end']),
+            'expense_percentage': round(year_data['expense_percentage'], 2)
+        })
+    
+    return formatted_results, actual_ret_age, calculator.auto_retirement_found
+
+# Каждый SSE-поток занимает поток сервера, поэтому их число ограничено
+live_channel = LiveChannel(run_projection, max_streams=int(os.environ.get('LIVE_MAX_STREAMS', 20)))
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+@app.route('/api/live/<session_id>', methods=['POST'])
+def live_update(session_id):
+    """
+    Новые параметры формы для живого пересчета.
+    
+    Принимает тот же JSON, что и /api/calculate. Результат приходит
+    в SSE-поток /api/live/<session_id>/stream; если параметры успели
+    смениться до окончания расчета, устаревший результат не отправляется.
+    """
+    if not SESSION_ID_RE.match(session_id):
+        return jsonify({'error': 'Некорректный идентификатор сессии'}), 400
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается JSON объект'}), 400
+    
+    try:
+        version = live_channel.submit(session_id, data)
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({'success': True, 'version': version}), 202
+
+@app.route('/api/live/<session_id>/stream')
+def live_stream(session_id):
+    """SSE-поток результатов живого пересчета (первое событие - полный прогноз, далее - разница)"""
+    if not SESSION_ID_RE.match(session_id):
+        return jsonify({'error': 'Некорректный идентификатор сессии'}), 400
+    
+    try:
+        stream = live_channel.open_sse_stream(session_id)
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/admin/analytics')
+def admin_analytics():
+    """
+    Сводная статистика по расчетам для администратора.
+    
+    Требует заголовок X-Admin-Token, совпадающий с переменной ADMIN_TOKEN.
+    Если ADMIN_TOKEN не задан, эндпоинт отключен.
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Not found'}), 404
+    
+    # compare_digest для str принимает только ASCII, поэтому сравниваем байты
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), admin_token.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    return jsonify({'success': True, **analytics.summary(), 'live': live_channel.stats()})
+
+@app.route('/telegram/<secret>', methods=['POST'])
+def telegram_webhook(secret):
+    """
+    Webhook для обновлений Telegram (режим BOT_MODE=webhook).
+    
+    Путь содержит секрет, а Telegram дублирует его в заголовке
+    X-Telegram-Bot-Api-Secret-Token. Обновление передается обработчикам бота.
+    """
+    import bot
+    
+    # compare_digest для str принимает только ASCII, поэтому сравниваем байты
+    if not bot.WEBHOOK_SECRET or not hmac.compare_digest(secret.encode(), bot.WEBHOOK_SECRET.encode()):
+        return jsonify({'error': 'Not found'}), 404
+    
+    header_secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(header_secret.encode(), bot.WEBHOOK_SECRET.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    payload = request.get_json(silent=True)
+    if not payload:
+        return jsonify({'error': 'Пустое обновление'}), 400
+    
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Ожидается JSON объект'}), 400
+    
+    try:
+        if not bot.feed_update(payload):
+            return jsonify({'error': 'Бот не запущен'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'ok': True})
+
+def start_polling_subprocess():
+    """Запуск бота в отдельном процессе (polling)"""
+    try:
+        print(f"Starting Bot as a subprocess using {sys.executable}...")
+        # Перенаправляем вывод бота в основной поток логов для отладки на Render
+        subprocess.Popen([sys.executable, "bot.py"], stdout=sys.stdout, stderr=sys.stderr)
+        print("Bot subprocess initiated and logging redirected.")
+    except Exception as e:
+        print(f"Failed to start bot subprocess: {e}")
+
 if __name__ == '__main__':
-    # Запуск бота в отдельном процессе
+    import bot
+    
+    # Сохраняем статистику при остановке сервера: Ctrl+C (atexit)
+    # и SIGTERM, которым Render останавливает сервис при редеплое
+    atexit.register(analytics.save)
+    
+    def handle_sigterm(signum, frame):
+        print("SIGTERM received, saving analytics snapshot...")
+        atexit.unregister(analytics.save)
+        analytics.save()
+        sys.exit(0)
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    if token:
-        try:
-            import sys
-            print(f"Starting Bot as a subprocess using {sys.executable}...")
-            # Перенаправляем вывод бота в основной поток логов для отладки на Render
-            subprocess.Popen([sys.executable, "bot.py"], stdout=sys.stdout, stderr=sys.stderr)
-            print("Bot subprocess initiated and logging redirected.")
-        except Exception as e:
-            print(f"Failed to start bot subprocess: {e}")
+    if token and bot.BOT_MODE == 'webhook':
+        # Бот работает внутри веб-сервера и получает обновления через /telegram/<secret>
+        if not bot.start_webhook(analytics):
+            print("Failed to start bot in webhook mode, falling back to polling.")
+            start_polling_subprocess()
+    elif token:
+        start_polling_subprocess()
     else:
         print("TELEGRAM_BOT_TOKEN not found in environment. Bot not started.")
     
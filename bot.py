@@ -6,8 +6,12 @@ from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMar
 from telegram.ext import Application, CommandHandler, ContextTypes
 import os
 import asyncio
+import hashlib
+import re
+import threading
 import httpx
 from dotenv import load_dotenv
+from analytics import Aggregator
 
 load_dotenv()
 
@@ -17,10 +21,29 @@ WEBAPP_URL = os.getenv('WEBAPP_URL', 'http://localhost:5000')
 # Если вы при создании Mini App указали не 'app', поменяйте здесь.
 MINI_APP_NAME = "app" 
 
-print(f"Bot script started. Token found: {bool(TELEGRAM_BOT_TOKEN)}, WebApp URL: {WEBAPP_URL}")
+# Режим получения обновлений: 'webhook' (обновления принимает app.py) или 'polling'.
+# Telegram присылает webhook только на HTTPS, поэтому локально по умолчанию используется polling.
+BOT_MODE = os.getenv('BOT_MODE', 'webhook' if WEBAPP_URL.startswith('https://') else 'polling')
+# Секрет для пути webhook и заголовка X-Telegram-Bot-Api-Secret-Token.
+# Если не задан явно, получаем его из токена, чтобы не хранить лишнюю переменную.
+WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET') or (
+    hashlib.sha256(TELEGRAM_BOT_TOKEN.encode()).hexdigest()[:32] if TELEGRAM_BOT_TOKEN else None
+)
+# Допустимые символы secret_token по документации Telegram Bot API
+WEBHOOK_SECRET_RE = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
 
-if not TELEGRAM_BOT_TOKEN:
-    print("CRITICAL ERROR: TELEGRAM_BOT_TOKEN is missing!")
+# Состояние webhook-режима: приложение бота и цикл событий его фонового потока
+_webhook_application = None
+_webhook_loop = None
+# Статистика веб-сервера, если бот работает в его процессе (webhook-режим)
+_analytics = None
+
+def _print_config():
+    """Вывод конфигурации при запуске бота"""
+    print(f"Bot script started. Token found: {bool(TELEGRAM_BOT_TOKEN)}, WebApp URL: {WEBAPP_URL}")
+    
+    if not TELEGRAM_BOT_TOKEN:
+        print("CRITICAL ERROR: TELEGRAM_BOT_TOKEN is missing!")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
@@ -169,6 +192,49 @@ async def post_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(error_msg + "\n\nПроверьте, что бот админ в канале.")
         print(f"Post command failed: {e}")
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сводная статистика по расчетам (только для владельца)"""
+    ADMIN_ID = 775697194
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    if _analytics is not None:
+        # Webhook-режим: бот в процессе веб-сервера, берем текущие данные
+        summary = _analytics.summary()
+        source = "текущие данные"
+    else:
+        # Polling-режим: бот в отдельном процессе, читаем сохраненный снимок
+        path = os.getenv('ANALYTICS_PATH', 'analytics_snapshot.json')
+        if not os.path.exists(path):
+            await update.message.reply_text("📭 Статистика пока не сохранена.")
+            return
+        summary = Aggregator(path).summary()
+        source = f"снимок: {summary['saved_at']}"
+
+    titles = {
+        'auto_retirement_age': '🏖️ Возраст пенсии (авто-поиск)',
+        'depletion_age': '📉 Возраст исчерпания капитала',
+        'savings_rate': '💰 Норма сбережений, %'
+    }
+    lines = [
+        f"📊 **Статистика расчетов** ({source})\n",
+        f"Всего расчетов: {summary['calculations']}",
+        f"Капитал не исчерпан: {summary['not_depleted']}",
+        f"Правило 4% не достигнуто (авто-поиск): {summary['auto_not_reached']}\n"
+    ]
+    for name, title in titles.items():
+        metric = summary['metrics'][name]
+        if not metric['count']:
+            lines.append(f"{title}: нет данных")
+            continue
+        q = metric['quantiles']
+        lines.append(
+            f"{title}: n={metric['count']}, среднее {metric['mean']}\n"
+            f"  p10 {q['p10']} · p25 {q['p25']} · медиана {q['p50']} · p75 {q['p75']} · p90 {q['p90']}"
+        )
+
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+
 async def keep_alive():
     """Фоновая задача для предотвращения 'засыпания' Render (Free Tier)"""
     if "localhost" in WEBAPP_URL or "127.0.0.1" in WEBAPP_URL:
@@ -188,10 +254,20 @@ async def keep_alive():
             # Ждем 14 минут (Render засыпает после 15 минут простоя)
             await asyncio.sleep(14 * 60)
 
-def main():
-    """Запуск бота"""
-    # Создаем приложение
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def _start_keep_alive(application):
+    """Запуск keep-alive в цикле событий приложения (режим polling)"""
+    application.create_task(keep_alive())
+
+def build_application(updater=True):
+    """Создание приложения бота с зарегистрированными обработчиками"""
+    builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
+    if updater:
+        # Polling: сервис сам себя пингует, чтобы Render не усыплял его
+        builder = builder.post_init(_start_keep_alive)
+    else:
+        # В webhook-режиме обновления кладутся в очередь вручную, Updater не нужен
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Регистрируем обработчики
     application.add_handler(CommandHandler("start", start))
@@ -199,15 +275,107 @@ def main():
     application.add_handler(CommandHandler("ping", ping))
     application.add_handler(CommandHandler("check", check_command))
     application.add_handler(CommandHandler("post", post_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    return application
+
+def webhook_path():
+    """Секретный путь, на который Telegram присылает обновления"""
+    return f"/telegram/{WEBHOOK_SECRET}"
+
+async def _setup_webhook(application):
+    """Инициализация бота и регистрация webhook в Telegram"""
+    await application.initialize()
+    webhook_url = WEBAPP_URL.rstrip('/') + webhook_path()
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES
+    )
+    await application.start()
+    print(f"Webhook registered at {WEBAPP_URL.rstrip('/')}/telegram/***")
+
+def start_webhook(analytics=None):
+    """
+    Запуск бота в режиме webhook.
     
-    # Запускаем бота
-    print("Bot is starting...")
+    Бот работает в фоновом потоке со своим циклом событий внутри процесса веб-сервера,
+    а обновления передаются ему через feed_update() из эндпоинта app.py.
+    Polling и keep-alive в этом режиме не нужны: Telegram сам будит сервис запросами.
+    analytics - Aggregator веб-сервера для команды /stats.
+    Возвращает False, если webhook не удалось зарегистрировать.
+    """
+    global _analytics
+    _print_config()
+    if not WEBHOOK_SECRET or not WEBHOOK_SECRET_RE.match(WEBHOOK_SECRET):
+        print("Webhook secret is invalid: allowed characters are A-Z, a-z, 0-9, _ and - (1-256).")
+        return False
+    
+    application = build_application(updater=False)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    cancelled = threading.Event()
+    
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(_setup_webhook(application))
+        except Exception as e:
+            print(f"Webhook setup failed: {e}")
+            ready.set()
+            return
+        if cancelled.is_set():
+            # Регистрация не уложилась в таймаут, app.py уже перешел на polling:
+            # снимаем webhook, иначе он будет конфликтовать с getUpdates
+            loop.run_until_complete(application.bot.delete_webhook())
+            loop.run_until_complete(application.stop())
+            loop.run_until_complete(application.shutdown())
+            return
+        global _webhook_application, _webhook_loop
+        _webhook_application = application
+        _webhook_loop = loop
+        ready.set()
+        loop.run_forever()
+    
+    print("Bot is starting in webhook mode...")
+    threading.Thread(target=run, name="telegram-bot", daemon=True).start()
+    if not ready.wait(timeout=30):
+        cancelled.set()
+        print("Webhook setup timed out.")
+        return False
+    if _webhook_application is None:
+        return False
+    _analytics = analytics
+    return True
+
+def feed_update(payload):
+    """
+    Передача обновления от Telegram в очередь приложения бота.
+    Возвращает False, если бот в webhook-режиме не запущен,
+    и выбрасывает ValueError, если обновление не удалось разобрать.
+    """
+    application, loop = _webhook_application, _webhook_loop
+    if application is None or loop is None:
+        return False
+    try:
+        update = Update.de_json(payload, application.bot)
+    except Exception as e:
+        raise ValueError(f'Некорректное обновление: {e}') from e
+    if update is None:
+        raise ValueError('Некорректное обновление: пустые данные')
+    asyncio.run_coroutine_threadsafe(application.update_queue.put(update), loop)
+    return True
+
+def main():
+    """Запуск бота в режиме polling (локальная разработка)"""
+    _print_config()
+    
+    # Создаем приложение
+    application = build_application()
     
-    # Запускаем задачу keep-alive в фоне
-    asyncio.get_event_loop().create_task(keep_alive())
+    # Запускаем бота (keep-alive стартует из post_init приложения)
+    print("Bot is starting...")
     
     # Принудительно создаем цикл событий для стабильности на Render (Python 3.12+)
-    import asyncio
     try:
         loop = asyncio.get_event_loop()
         if loop.is_closed():
@@ -217,6 +385,7 @@ def main():
         asyncio.set_event_loop(loop)
     
     print("Bot is running and loop is set!")
+    # run_polling сам удаляет ранее зарегистрированный webhook
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
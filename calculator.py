@@ -19,6 +19,8 @@ class InvestmentCalculator:
         # Режимы пенсии
         self.retirement_mode = params.get('retirement_mode', 'manual') # 'manual' или 'auto'
         self.retirement_age = params.get('retirement_age', 60)
+        # Выполнилось ли правило 4% в режиме 'auto' (заполняется в get_full_projection)
+        self.auto_retirement_found = None
         
     def calculate_year(self, year_num, prev_year_data, actual_retirement_age=None):
         """
@@ -104,7 +106,10 @@ class InvestmentCalculator:
         actual_retirement_age = self.retirement_age
         
         if self.retirement_mode == 'auto':
-            actual_retirement_age = self._find_auto_retirement_age(max_age)
+            found_age = self._find_auto_retirement_age(max_age)
+            self.auto_retirement_found = found_age is not None
+            # Если правило 4% не выполнилось, выходим на пенсию в конце прогноза
+            actual_retirement_age = found_age if found_age is not None else max_age
             
         results = []
         prev_year_data = None
@@ -122,6 +127,7 @@ class InvestmentCalculator:
     def _find_auto_retirement_age(self, max_age):
         """
         Ищет минимальный возраст, когда расходы / капитал <= 4%.
+        Возвращает None, если такой возраст не найден до max_age.
         """
         prev_year_data = None
         for year_num in range(1, max_age - self.current_age + 1):
@@ -139,4 +145,4 @@ class InvestmentCalculator:
             prev_year_data = year_data
             if year_data['total_capital_end'] == 'Ø':
                 break
-        return max_age # Если не нашли, выходим в конце
+        return None # Не нашли
@@ -0,0 +1,190 @@
+"""
+Канал живого пересчета для Mini App (SSE + POST).
+
+Клиент отправляет параметры формы POST-запросами, а результаты получает
+через один постоянный поток Server-Sent Events. Быстрые серии обновлений
+схлопываются: считается только последняя версия параметров, устаревшие
+результаты отбрасываются, а клиенту отправляются только изменившиеся строки.
+"""
+
+import json
+import threading
+import time
+
+class LiveSession:
+    """Состояние одной сессии живого пересчета"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = None  # последние присланные параметры
+        self.version = 0  # номер последней версии параметров
+        self.streams = 0  # количество открытых SSE-потоков
+        self.touched = time.monotonic()
+
+class LiveChannel:
+    """
+    Реестр сессий живого пересчета.
+
+    compute(data) получает параметры формы и возвращает
+    (список данных по годам, фактический возраст пенсии).
+    Каждый открытый поток занимает поток сервера, поэтому их число
+    ограничено max_streams.
+    """
+
+    def __init__(self, compute, session_ttl=600, max_sessions=1000, max_streams=20, heartbeat=15):
+        self.compute = compute
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.max_streams = max_streams
+        self.heartbeat = heartbeat
+        self.sessions = {}
+        self.active_streams = 0
+        self.lock = threading.Lock()
+        # Счетчики для оценки экономии запросов
+        self.counters = {'received': 0, 'computed': 0, 'dropped': 0, 'sent': 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """Счетчики канала для админки"""
+        with self.lock:
+            return {
+                **self.counters,
+                'sessions': len(self.sessions),
+                'active_streams': self.active_streams,
+                'max_streams': self.max_streams
+            }
+
+    def _get_session(self, session_id):
+        with self.lock:
+            self._prune()
+            session = self.sessions.get(session_id)
+            if session is None:
+                if len(self.sessions) >= self.max_sessions:
+                    raise OverflowError('Слишком много активных сессий')
+                session = self.sessions[session_id] = LiveSession()
+            session.touched = time.monotonic()
+            return session
+
+    def _prune(self):
+        """Удаление сессий без открытых потоков, неактивных дольше session_ttl"""
+        deadline = time.monotonic() - self.session_ttl
+        for session_id, session in list(self.sessions.items()):
+            if session.streams == 0 and session.touched < deadline:
+                del self.sessions[session_id]
+
+    def submit(self, session_id, data):
+        """
+        Сохранение новых параметров сессии. Предыдущие непосчитанные
+        параметры перезаписываются. Возвращает номер версии.
+        """
+        session = self._get_session(session_id)
+        with session.condition:
+            session.version += 1
+            session.pending = data
+            session.condition.notify_all()
+            version = session.version
+        self._count('received')
+        return version
+
+    def open_stream(self, session_id):
+        """
+        Открытие потока событий сессии.
+
+        Сессия и место для потока резервируются сразу (OverflowError при
+        превышении лимитов), а возвращаемый генератор выдает словари
+        с результатом (первый - полный, далее - разница с предыдущим
+        прогнозом) или None, если за heartbeat секунд новых данных не было.
+        """
+        session = self._get_session(session_id)
+        with self.lock:
+            if self.active_streams >= self.max_streams:
+                raise OverflowError('Слишком много открытых потоков')
+            self.active_streams += 1
+        with session.condition:
+            session.streams += 1
+        events = self._stream(session)
+        # Запускаем генератор до первого yield, чтобы close() освободил место
+        # даже если клиент отключится до первого события
+        next(events)
+        return events
+
+    def _stream(self, session):
+        previous = None
+        seen = 0
+        try:
+            yield None
+            while True:
+                with session.condition:
+                    if session.version == seen:
+                        session.condition.wait(timeout=self.heartbeat)
+                    if session.version == seen:
+                        session.touched = time.monotonic()
+                        data = None
+                    else:
+                        data, seen = session.pending, session.version
+                if data is None:
+                    yield None
+                    continue
+
+                try:
+                    rows, actual_ret_age = self.compute(data)
+                    error = None
+                except Exception as e:
+                    error = str(e)
+                self._count('computed')
+
+                # Пока считали, пришли новые параметры - результат уже не нужен
+                if session.version != seen:
+                    self._count('dropped')
+                    continue
+
+                if error is not None:
+                    yield {'version': seen, 'error': error}
+                    continue
+
+                event = {
+                    'version': seen,
+                    'actual_retirement_age': actual_ret_age,
+                    'full': previous is None,
+                    'length': len(rows),
+                    'changed': diff_rows(previous, rows)
+                }
+                previous = rows
+                self._count('sent')
+                yield event
+        finally:
+            with session.condition:
+                session.streams -= 1
+                session.touched = time.monotonic()
+            with self.lock:
+                self.active_streams -= 1
+
+    def open_sse_stream(self, session_id):
+        """Поток событий сессии в формате text/event-stream"""
+        return self._sse(self.open_stream(session_id))
+
+    @staticmethod
+    def _sse(events):
+        # Первый комментарий сразу отправляет заголовки ответа клиенту
+        yield ': connected\n\n'
+        for event in events:
+            if event is None:
+                # Комментарий-пинг: держит соединение и выявляет отключения клиента
+                yield ': ping\n\n'
+            else:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+def diff_rows(previous, rows):
+    """
+    Разница между прогнозами: список пар [индекс, строка] для строк,
+    которые отличаются от предыдущего прогноза или появились в нем.
+    """
+    if previous is None:
+        return [[i, row] for i, row in enumerate(rows)]
+    return [
+        [i, row] for i, row in enumerate(rows)
+        if i >= len(previous) or previous[i] != row
+    ]
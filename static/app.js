@@ -9,6 +9,13 @@ if (tg) {
 let calculationResults = [];
 let chart = null;
 
+// Live recalculation: params are POSTed on input, results come via one SSE stream
+const LIVE_DEBOUNCE_MS = 250;
+const liveSessionId = (crypto.randomUUID ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2));
+let liveEnabled = false;
+let liveSource = null;
+let liveTimer = null;
+
 // DOM elements
 const form = document.getElementById('calculatorForm');
 const formCard = document.getElementById('formCard');
@@ -93,11 +100,14 @@ function cleanNumericValue(val) {
 
 // Event listeners
 form.addEventListener('submit', handleFormSubmit);
+form.addEventListener('input', scheduleLiveUpdate);
+form.addEventListener('change', scheduleLiveUpdate);
 
 editDataBtn.addEventListener('click', () => {
     formCard.style.display = 'block';
     editDataContainer.style.display = 'none';
-    resultsSection.style.display = 'none';
+    // Keep results visible while editing: they are recalculated live
+    resultsSection.style.display = liveEnabled ? 'block' : 'none';
 });
 
 toggleTableBtn.addEventListener('click', () => {
@@ -186,15 +196,14 @@ resetBtn.addEventListener('click', () => {
         }
     });
     updateRetirementModeUI();
+    scheduleLiveUpdate();
     // Optional: clear local storage too? No, let user decide when to save.
 });
 
-// Form submission handler
-async function handleFormSubmit(e) {
-    e.preventDefault();
-
+// Collect form values into API payload
+function collectFormData() {
     const formData = new FormData(form);
-    const data = {
+    return {
         initial_capital: parseFloat(cleanNumericValue(formData.get('initialCapital'))),
         monthly_income: parseFloat(cleanNumericValue(formData.get('monthlyIncome'))),
         monthly_living_expenses: parseFloat(cleanNumericValue(formData.get('monthlyLivingExpenses'))),
@@ -206,6 +215,13 @@ async function handleFormSubmit(e) {
         retirement_mode: formData.get('retirement_mode'),
         max_age: parseInt(formData.get('maxAge')) || 90
     };
+}
+
+// Form submission handler
+async function handleFormSubmit(e) {
+    e.preventDefault();
+
+    const data = collectFormData();
 
     // Validation
     if (data.retirement_mode === 'manual' && data.retirement_age <= data.current_age) {
@@ -243,6 +259,8 @@ async function calculateInvestment(data) {
         if (result.success) {
             calculationResults = result.data;
             displayResults(calculationResults, result.actual_retirement_age);
+            // Without EventSource results could never arrive, so don't POST live updates
+            liveEnabled = !!window.EventSource;
         } else {
             showWarning('Ошибка: ' + result.error);
         }
@@ -254,8 +272,81 @@ async function calculateInvestment(data) {
     }
 }
 
+// Live recalculation
+function scheduleLiveUpdate() {
+    if (!liveEnabled || formCard.style.display === 'none') return;
+    clearTimeout(liveTimer);
+    liveTimer = setTimeout(sendLiveUpdate, LIVE_DEBOUNCE_MS);
+}
+
+async function sendLiveUpdate() {
+    const data = collectFormData();
+    const values = Object.entries(data).filter(([k]) => k !== 'retirement_mode').map(([, v]) => v);
+    // Skip incomplete input while the user is still typing
+    if (values.some(v => isNaN(v))) return;
+    if (data.retirement_mode === 'manual' && data.retirement_age <= data.current_age) return;
+
+    try {
+        const response = await fetch(`/api/live/${liveSessionId}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(data)
+        });
+        if (response.ok) {
+            saveToLocalStorage(data);
+            // Open the stream only after the POST: a new stream starts from the
+            // session's latest params, so stale ones from a previous edit never flash
+            openLiveStream();
+        }
+    } catch (error) {
+        console.error('Live update error:', error);
+    }
+}
+
+function openLiveStream() {
+    if (liveSource || !window.EventSource) return;
+    const source = new EventSource(`/api/live/${liveSessionId}/stream`);
+    source.onmessage = (e) => applyLiveResult(JSON.parse(e.data));
+    source.onerror = () => {
+        // On reconnect the server starts with a full projection again
+        if (source.readyState === EventSource.CLOSED && liveSource === source) liveSource = null;
+    };
+    liveSource = source;
+}
+
+// Each open stream holds a server thread: close it whenever live updates are not needed.
+// A new stream always starts with a full projection, so the diff base is resynced.
+function closeLiveStream() {
+    clearTimeout(liveTimer);
+    if (liveSource) {
+        liveSource.close();
+        liveSource = null;
+    }
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) closeLiveStream();
+});
+
+function applyLiveResult(result) {
+    if (result.error) {
+        console.warn('Live calculation error:', result.error);
+        return;
+    }
+
+    // First event after (re)connect is full, then only changed rows arrive
+    const results = result.full ? [] : calculationResults.slice(0, result.length);
+    result.changed.forEach(([index, row]) => { results[index] = row; });
+    calculationResults = results;
+
+    renderResults(calculationResults, result.actual_retirement_age);
+}
+
 // Display results
 function displayResults(results, actualRetirementAge) {
+    // Results now come from /api/calculate, not from the live stream diff base
+    closeLiveStream();
+
     resultsSection.style.display = 'block';
     formCard.style.display = 'none';
     editDataContainer.style.display = 'block';
@@ -264,11 +355,15 @@ function displayResults(results, actualRetirementAge) {
     tableContainer.style.display = 'none';
     toggleTableBtn.innerText = '📋 Показать детальную таблицу';
 
+    renderResults(results, actualRetirementAge);
+
+    resultsSection.scrollIntoView({ behavior: 'smooth' });
+}
+
+function renderResults(results, actualRetirementAge) {
     renderChart(results, actualRetirementAge);
     renderTable(results, actualRetirementAge);
     renderSummary(results, actualRetirementAge);
-
-    resultsSection.scrollIntoView({ behavior: 'smooth' });
 }
 
 // Render Chart.js chart
@@ -0,0 +1,197 @@
+"""
+Tests for streaming analytics
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analytics import Aggregator, Metric, P2Quantile
+from app import app, run_projection, run_projection_details
+import app as app_module
+import asyncio
+import bot
+import json
+import random
+
+def test_p2_quantile_accuracy():
+    """Test P² estimates against exact quantiles"""
+    rng = random.Random(42)
+    values = [rng.gauss(50, 10) for _ in range(20000)]
+    
+    for p in (0.1, 0.5, 0.9):
+        estimator = P2Quantile(p)
+        for v in values:
+            estimator.add(v)
+        exact = sorted(values)[int(p * len(values))]
+        assert abs(estimator.value() - exact) < 0.5
+
+def test_p2_quantile_small_sample():
+    """Test quantile before five observations are collected"""
+    estimator = P2Quantile(0.5)
+    assert estimator.value() is None
+    for v in (3, 1, 2):
+        estimator.add(v)
+    assert estimator.value() == 2
+
+def test_metric_histogram():
+    """Test histogram bins and constant memory"""
+    metric = Metric(0, 120, 1)
+    ages = [45] * 1000 + [50] * 500 + [150]
+    random.Random(1).shuffle(ages)
+    for age in ages:
+        metric.add(age)
+    
+    summary = metric.summary()
+    assert summary['count'] == 1501
+    assert summary['histogram']['bins'] == {'45': 1000, '50': 500}
+    assert summary['histogram']['overflow'] == 1
+    assert abs(summary['quantiles']['p50'] - 45) < 1
+    assert len(metric.bins) == 120
+
+def test_aggregator_record_and_snapshot(tmp_path):
+    """Test recording real projections and restoring from snapshot"""
+    path = str(tmp_path / 'analytics.json')
+    aggregator = Aggregator(path)
+    data = {
+        'initial_capital': 10000,
+        'monthly_income': 3000,
+        'monthly_living_expenses': 1500,
+        'income_growth_rate': 3,
+        'interest_rate': 8,
+        'inflation_rate': 3,
+        'current_age': 30,
+        'retirement_age': 45,
+        'retirement_mode': 'auto'
+    }
+    results, actual_ret_age, auto_found = run_projection_details(data)
+    aggregator.record(data, results, actual_ret_age, auto_found)
+    
+    # Капитал исчерпывается при ранней пенсии без накоплений
+    poor = dict(data, initial_capital=0, retirement_mode='manual', retirement_age=31)
+    results, _ = run_projection(poor)
+    aggregator.record(poor, results, 31)
+    
+    summary = aggregator.summary()
+    assert summary['calculations'] == 2
+    assert summary['metrics']['auto_retirement_age']['min'] == actual_ret_age
+    assert summary['metrics']['depletion_age']['count'] == 1
+    assert summary['metrics']['savings_rate']['quantiles']['p50'] == 50
+    
+    aggregator.save()
+    restored = Aggregator(path)
+    assert restored.summary()['metrics'] == summary['metrics']
+    assert restored.saved_at is not None
+
+def test_aggregator_auto_not_reached():
+    """Test that auto mode without reaching the 4% rule is not recorded as an age"""
+    aggregator = Aggregator()
+    data = {
+        'initial_capital': 0,
+        'monthly_income': 1000,
+        'monthly_living_expenses': 990,
+        'income_growth_rate': 0,
+        'interest_rate': 8,
+        'inflation_rate': 5,
+        'current_age': 30,
+        'retirement_age': 60,
+        'retirement_mode': 'auto',
+        'max_age': 90
+    }
+    results, actual_ret_age, auto_found = run_projection_details(data)
+    assert actual_ret_age == 90
+    assert auto_found == False
+    aggregator.record(data, results, actual_ret_age, auto_found)
+    
+    summary = aggregator.summary()
+    assert summary['auto_not_reached'] == 1
+    assert summary['metrics']['auto_retirement_age']['count'] == 0
+
+def test_aggregator_auto_reached_in_final_year():
+    """Test that the 4% rule met exactly at max_age is recorded as an age"""
+    data = {
+        'initial_capital': 10000,
+        'monthly_income': 3000,
+        'monthly_living_expenses': 1500,
+        'income_growth_rate': 3,
+        'interest_rate': 8,
+        'inflation_rate': 3,
+        'current_age': 30,
+        'retirement_age': 45,
+        'retirement_mode': 'auto'
+    }
+    _, found_age = run_projection(data)
+    
+    # Горизонт прогноза заканчивается ровно в год выполнения правила
+    data['max_age'] = found_age
+    results, actual_ret_age, auto_found = run_projection_details(data)
+    assert actual_ret_age == found_age
+    assert auto_found == True
+    
+    aggregator = Aggregator()
+    aggregator.record(data, results, actual_ret_age, auto_found)
+    summary = aggregator.summary()
+    assert summary['auto_not_reached'] == 0
+    assert summary['metrics']['auto_retirement_age']['min'] == found_age
+
+def test_savings_rate_full():
+    """Test that a 100% savings rate lands in a histogram bin"""
+    aggregator = Aggregator()
+    aggregator.record({'monthly_income': 1000, 'monthly_living_expenses': 0},
+                      [{'age': 40, 'total_capital_end': 100}], 40)
+    histogram = aggregator.summary()['metrics']['savings_rate']['histogram']
+    assert histogram['bins'] == {'100': 1}
+    assert histogram['overflow'] == 0
+
+def test_aggregator_periodic_snapshot(tmp_path):
+    """Test that record() writes a snapshot once the interval passes"""
+    path = str(tmp_path / 'analytics.json')
+    aggregator = Aggregator(path, snapshot_interval=0)
+    data = {'monthly_income': 1000, 'monthly_living_expenses': 500}
+    aggregator.record(data, [{'age': 40, 'total_capital_end': 100}], 40)
+    
+    with open(path) as f:
+        assert json.load(f)['calculations'] == 1
+
+def test_api_admin_analytics(monkeypatch):
+    """Test admin endpoint authentication"""
+    client = app.test_client()
+    monkeypatch.setattr(app_module, 'analytics', Aggregator())
+    
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.get('/api/admin/analytics').status_code == 404
+    
+    monkeypatch.setenv('ADMIN_TOKEN', 'admin-secret')
+    assert client.get('/api/admin/analytics').status_code == 403
+    
+    # Не-ASCII токен - отказ, а не 500
+    assert client.get('/api/admin/analytics', headers={'X-Admin-Token': 'é'}).status_code == 403
+    
+    response = client.get('/api/admin/analytics', headers={'X-Admin-Token': 'admin-secret'})
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert result['calculations'] == 0
+    assert 'savings_rate' in result['metrics']
+    assert 'active_streams' in result['live']
+
+def test_bot_stats_in_process(monkeypatch):
+    """Test /stats reads live analytics when the bot runs inside the web process"""
+    aggregator = Aggregator()
+    aggregator.record({'monthly_income': 1000, 'monthly_living_expenses': 500},
+                      [{'age': 40, 'total_capital_end': 100}], 40)
+    monkeypatch.setattr(bot, '_analytics', aggregator)
+    monkeypatch.setenv('ANALYTICS_PATH', 'missing_snapshot.json')
+    
+    replies = []
+    class Message:
+        async def reply_text(self, text, **kwargs):
+            replies.append(text)
+    class User:
+        id = 775697194
+    class FakeUpdate:
+        effective_user = User()
+        message = Message()
+    
+    asyncio.run(bot.stats_command(FakeUpdate(), None))
+    assert 'текущие данные' in replies[0]
+    assert 'Всего расчетов: 1' in replies[0]
@@ -7,7 +7,10 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import app
+import asyncio
+import bot
 import json
+import threading
 
 def test_api_calculate():
     """Test /api/calculate endpoint"""
@@ -78,6 +81,64 @@ def test_api_invalid_ages():
     result = json.loads(response.data)
     assert 'error' in result
 
+def test_telegram_webhook_auth(monkeypatch):
+    """Test webhook endpoint rejects wrong secrets and reports stopped bot"""
+    client = app.test_client()
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', 'test-secret')
+    monkeypatch.setattr(bot, '_webhook_application', None)
+    update = {'update_id': 1}
+    
+    response = client.post('/telegram/wrong', json=update,
+                           headers={'X-Telegram-Bot-Api-Secret-Token': 'test-secret'})
+    assert response.status_code == 404
+    
+    response = client.post('/telegram/test-secret', json=update)
+    assert response.status_code == 403
+    
+    # Не-ASCII секрет в пути или заголовке - отказ, а не 500
+    response = client.post('/telegram/%D0%BF', json=update,
+                           headers={'X-Telegram-Bot-Api-Secret-Token': 'test-secret'})
+    assert response.status_code == 404
+    
+    response = client.post('/telegram/test-secret', json=update,
+                           headers={'X-Telegram-Bot-Api-Secret-Token': 'é'})
+    assert response.status_code == 403
+    
+    response = client.post('/telegram/test-secret', json=update,
+                           headers={'X-Telegram-Bot-Api-Secret-Token': 'test-secret'})
+    assert response.status_code == 503
+
+def test_telegram_webhook_dispatch(monkeypatch):
+    """Test webhook endpoint puts updates into the bot update queue"""
+    client = app.test_client()
+    application = bot.Application.builder().token('123:TEST').updater(None).build()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', 'test-secret')
+    monkeypatch.setattr(bot, '_webhook_application', application)
+    monkeypatch.setattr(bot, '_webhook_loop', loop)
+    
+    try:
+        response = client.post('/telegram/test-secret', json={'update_id': 42},
+                               headers={'X-Telegram-Bot-Api-Secret-Token': 'test-secret'})
+        assert response.status_code == 200
+        
+        queued = asyncio.run_coroutine_threadsafe(application.update_queue.get(), loop).result(timeout=5)
+        assert queued.update_id == 42
+        
+        # Некорректное обновление - JSON ошибка 400, а не 500
+        response = client.post('/telegram/test-secret', json={'update_id': 43, 'message': {'bad': 1}},
+                               headers={'X-Telegram-Bot-Api-Secret-Token': 'test-secret'})
+        assert response.status_code == 400
+        assert 'error' in json.loads(response.data)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+def test_webhook_invalid_secret(monkeypatch):
+    """Test webhook mode is not started with a secret Telegram rejects"""
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', 'bad secret!')
+    assert bot.start_webhook() == False
+
 if __name__ == '__main__':
     test_api_calculate()
     test_api_validation()
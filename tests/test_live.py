@@ -0,0 +1,137 @@
+"""
+Tests for live recalculation channel
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from live import LiveChannel, diff_rows
+from app import app
+import json
+
+def test_diff_rows():
+    """Test that only changed and appended rows are sent"""
+    previous = [{'age': 31, 'v': 1}, {'age': 32, 'v': 2}]
+    rows = [{'age': 31, 'v': 1}, {'age': 32, 'v': 3}, {'age': 33, 'v': 4}]
+    
+    assert diff_rows(None, rows) == [[0, rows[0]], [1, rows[1]], [2, rows[2]]]
+    assert diff_rows(previous, rows) == [[1, rows[1]], [2, rows[2]]]
+    assert diff_rows(rows, rows) == []
+
+def test_coalescing():
+    """Test that rapid updates are coalesced into one computation"""
+    calls = []
+    def compute(data):
+        calls.append(data['n'])
+        return [{'n': data['n']}], 45
+    
+    channel = LiveChannel(compute, heartbeat=0.01)
+    for n in range(1, 6):
+        channel.submit('session-1', {'n': n})
+    
+    events = channel.open_stream('session-1')
+    event = next(events)
+    assert calls == [5]
+    assert event['version'] == 5
+    assert event['full'] == True
+    assert event['changed'] == [[0, {'n': 5}]]
+    
+    # Без новых данных поток отдает пинг
+    assert next(events) is None
+    
+    # Повторная отправка тех же строк дает пустую разницу
+    channel.submit('session-1', {'n': 5})
+    event = next(events)
+    assert event['full'] == False
+    assert event['changed'] == []
+    events.close()
+
+def test_superseded_result_dropped():
+    """Test that a result is dropped when newer parameters arrive during computation"""
+    channel = None
+    def compute(data):
+        if data['n'] == 1:
+            channel.submit('session-2', {'n': 2})
+        return [{'n': data['n']}], 45
+    
+    channel = LiveChannel(compute, heartbeat=0.01)
+    channel.submit('session-2', {'n': 1})
+    events = channel.open_stream('session-2')
+    event = next(events)
+    
+    assert event['version'] == 2
+    assert event['changed'] == [[0, {'n': 2}]]
+    assert channel.stats()['dropped'] == 1
+    events.close()
+
+def test_stream_limit():
+    """Test that concurrent streams are capped and released on close"""
+    channel = LiveChannel(lambda data: ([], 45), max_streams=1, heartbeat=0.01)
+    events = channel.open_stream('session-3')
+    assert channel.stats()['active_streams'] == 1
+    try:
+        channel.open_stream('session-4')
+        assert False, 'OverflowError expected'
+    except OverflowError:
+        pass
+    
+    # Поток освобождается, даже если клиент отключился до первого события
+    events.close()
+    assert channel.stats()['active_streams'] == 0
+    channel.open_stream('session-4').close()
+
+def test_session_limit():
+    """Test that sessions are limited and idle ones are pruned"""
+    channel = LiveChannel(lambda data: ([], 45), session_ttl=0, max_sessions=1)
+    channel.submit('session-a', {})
+    # Неактивная сессия без потоков удаляется, освобождая место
+    channel.submit('session-b', {})
+    assert list(channel.sessions) == ['session-b']
+    
+    channel = LiveChannel(lambda data: ([], 45), max_sessions=1)
+    channel.submit('session-a', {})
+    try:
+        channel.submit('session-b', {})
+        assert False, 'OverflowError expected'
+    except OverflowError:
+        pass
+
+def test_api_live_stream():
+    """Test /api/live endpoints with real calculation"""
+    client = app.test_client()
+    data = {
+        'initial_capital': 10000,
+        'monthly_income': 3000,
+        'monthly_living_expenses': 1500,
+        'income_growth_rate': 3,
+        'interest_rate': 8,
+        'inflation_rate': 3,
+        'current_age': 30,
+        'retirement_age': 45,
+        'max_age': 90
+    }
+    
+    response = client.post('/api/live/bad', json=data)
+    assert response.status_code == 400
+    
+    response = client.post('/api/live/test-session', json=data)
+    assert response.status_code == 202
+    assert json.loads(response.data)['version'] == 1
+    
+    response = client.get('/api/live/test-session/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    
+    chunks = iter(response.response)
+    assert next(chunks) == b': connected\n\n'
+    event = json.loads(next(chunks).decode()[len('data: '):])
+    assert event['full'] == True
+    assert event['length'] == len(event['changed']) == 60
+    
+    # Изменение горизонта прогноза добавляет только одну строку
+    client.post('/api/live/test-session', json=dict(data, max_age=91))
+    event = json.loads(next(chunks).decode()[len('data: '):])
+    assert event['length'] == 61
+    assert [i for i, row in event['changed']] == [60]
+    response.close()